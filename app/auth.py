@@ -1,12 +1,17 @@
+import base64
+import hashlib
+import hmac
+import json
 import os
 import secrets
-from datetime import datetime, timedelta
-from typing import Optional
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
 
 # Configuration test deploz
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
@@ -14,59 +19,165 @@ REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+REFRESH_TOKEN_EXPIRE_SECONDS = REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+# bcrypt work factor; each step doubles hashing time (tests lower it to 4)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Require the Rust-backed bcrypt (4.0+) rather than an older C-extension release
+if int(bcrypt.__version__.split(".")[0]) < 4:
+    raise RuntimeError(f"bcrypt>=4.0 is required, found {bcrypt.__version__}")
+
+# Signing keys encoded once instead of on every encode/decode call
+_SECRET_BYTES = SECRET_KEY.encode("utf-8")
+_REFRESH_SECRET_BYTES = REFRESH_SECRET_KEY.encode("utf-8")
+
+
+class JWTError(Exception):
+    """Raised when a token is malformed, has a bad signature or has expired."""
+
+
+def _b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+# Every token we issue uses the same algorithm, so the encoded header never
+# changes and verification can compare it byte for byte instead of parsing it
+_JWT_HEADER_B64 = _b64url_encode(
+    json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode("utf-8")
+)
 
 # Security scheme
 security = HTTPBearer()
 
+# Successfully verified tokens, keyed by (token type, sha256 of the token) and
+# holding (exp, payload) so repeat requests with the same token skip decoding
+VERIFY_CACHE_MAX_SIZE = 10_000
+_verify_cache: Dict[Tuple[str, bytes], Tuple[float, dict]] = {}
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
+
+def _verify_password_sync(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
 
 
-def get_password_hash(password: str) -> str:
-    """Hash a password."""
-    salt = bcrypt.gensalt()
+def _hash_password_sync(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
 
+# Hash checked against when the user does not exist, so a failed login costs
+# the same bcrypt work whether or not the email is registered.
+DUMMY_PASSWORD_HASH = _hash_password_sync(secrets.token_urlsafe(16))
+
+
+# bcrypt is CPU-bound and releases the GIL, so running it in the threadpool
+# keeps the event loop free for other requests while a hash is computed.
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash."""
+    return await run_in_threadpool(
+        _verify_password_sync, plain_password, hashed_password
+    )
+
+
+async def get_password_hash(password: str) -> str:
+    """Hash a password."""
+    return await run_in_threadpool(_hash_password_sync, password)
+
+
+def _sign(signing_input: bytes, key: bytes) -> bytes:
+    # hmac.digest runs in C in a single call, unlike building an hmac.HMAC
+    return hmac.digest(key, signing_input, "sha256")
+
+
+def _encode_jwt(payload: dict, key: bytes) -> str:
+    """Encode an HS256 JWT."""
+    payload_b64 = _b64url_encode(
+        json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    )
+    signing_input = _JWT_HEADER_B64 + b"." + payload_b64
+    signature = _b64url_encode(_sign(signing_input, key))
+    return (signing_input + b"." + signature).decode("ascii")
+
+
+def _decode_jwt(token: str, key: bytes) -> dict:
+    """Verify an HS256 JWT and return its payload."""
+    try:
+        raw = token.encode("ascii")
+        # Locate both separators from the right without splitting the token
+        signature_dot = raw.rfind(b".")
+        header_dot = raw.rfind(b".", 0, signature_dot)
+        if header_dot < 0 or raw[:header_dot] != _JWT_HEADER_B64:
+            raise JWTError("Malformed token")
+
+        signing_input = raw[:signature_dot]
+        expected = _b64url_encode(_sign(signing_input, key))
+        if not hmac.compare_digest(expected, raw[signature_dot + 1 :]):
+            raise JWTError("Signature verification failed")
+
+        # Only decode the payload once the signature is known to be good
+        payload = json.loads(_b64url_decode(raw[header_dot + 1 : signature_dot]))
+    except ValueError:
+        raise JWTError("Malformed token")
+
+    if not isinstance(payload, dict):
+        raise JWTError("Malformed token")
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        raise JWTError("Token has expired")
+
+    return payload
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
     to_encode = data.copy()
+    # exp is written as an integer Unix timestamp, the form JWT expects
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time() + expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
 
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _encode_jwt(to_encode, _SECRET_BYTES)
     return encoded_jwt
 
 
 def create_refresh_token(data: dict) -> str:
     """Create JWT refresh token."""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = int(time.time()) + REFRESH_TOKEN_EXPIRE_SECONDS
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _encode_jwt(to_encode, _REFRESH_SECRET_BYTES)
     return encoded_jwt
 
 
 def verify_token(token: str, token_type: str = "access") -> dict:
     """Verify and decode JWT token."""
+    cache_key = (token_type, hashlib.sha256(token.encode("utf-8")).digest())
+    cached = _verify_cache.get(cache_key)
+    if cached is not None:
+        exp, payload = cached
+        if time.time() < exp:
+            return dict(payload)
+        _verify_cache.pop(cache_key, None)
+
     try:
-        secret = SECRET_KEY if token_type == "access" else REFRESH_SECRET_KEY
-        payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+        secret = _SECRET_BYTES if token_type == "access" else _REFRESH_SECRET_BYTES
+        payload = _decode_jwt(token, secret)
 
-        if payload.get("type") != token_type:
+        if not hmac.compare_digest(
+            str(payload.get("type", "")).encode("utf-8"), token_type.encode("utf-8")
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token type"
             )
-
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,14 +185,23 @@ def verify_token(token: str, token_type: str = "access") -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    if len(_verify_cache) >= VERIFY_CACHE_MAX_SIZE:
+        # Evict the oldest entry (dicts keep insertion order)
+        del _verify_cache[next(iter(_verify_cache))]
+    _verify_cache[cache_key] = (payload["exp"], payload)
 
-async def get_current_user(
+    return dict(payload)
+
+
+async def get_token_payload(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> dict:
-    """Get current user from JWT token."""
-    token = credentials.credentials
-    payload = verify_token(token, "access")
+    """Get the verified payload of the bearer access token."""
+    return verify_token(credentials.credentials, "access")
 
+
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> dict:
+    """Get current user from JWT token."""
     user_id: str = payload.get("sub")
     email: str = payload.get("email")
 
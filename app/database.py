@@ -1,24 +1,100 @@
 import uuid
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 # In-memory database (for development)
 # In production, replace with actual database (PostgreSQL, MongoDB, etc.)
-users_db: Dict[str, dict] = {}
-user_email_index: Dict[str, str] = {}  # email -> user_id mapping
+# Users are stored column-wise: one list per field, where a user occupies the
+# same position in every list. id_to_idx/email_to_idx map to that position.
+user_ids: List[str] = []
+emails: List[str] = []
+usernames: List[str] = []
+hashed_passwords: List[str] = []
+full_names: List[Optional[str]] = []
+created_ats: List[datetime] = []
+is_active = bytearray()
+
+id_to_idx: Dict[str, int] = {}
+email_to_idx: Dict[str, int] = {}
+
+# Everything that makes up the store, so helpers touching all of it stay in
+# sync when a column is added
+_COLUMNS = (
+    user_ids,
+    emails,
+    usernames,
+    hashed_passwords,
+    full_names,
+    created_ats,
+    is_active,
+)
+_INDEXES = (id_to_idx, email_to_idx)
+
+
+def _user_at(idx: int) -> dict:
+    """Build the user dict for a row."""
+    return {
+        "id": user_ids[idx],
+        "email": emails[idx],
+        "username": usernames[idx],
+        "hashed_password": hashed_passwords[idx],
+        "full_name": full_names[idx],
+        "created_at": created_ats[idx],
+        "is_active": bool(is_active[idx]),
+    }
+
+
+def clear_users() -> None:
+    """Remove all users."""
+    for column in _COLUMNS:
+        column.clear()
+    for index in _INDEXES:
+        index.clear()
+
+
+def snapshot_users() -> tuple:
+    """Copy the whole store, for a later restore_users()."""
+    return (
+        tuple(column.copy() for column in _COLUMNS),
+        tuple(index.copy() for index in _INDEXES),
+    )
+
+
+def restore_users(snapshot: tuple) -> None:
+    """Replace the store with a copy taken by snapshot_users()."""
+    columns, indexes = snapshot
+    for column, saved_column in zip(_COLUMNS, columns):
+        column[:] = saved_column
+    for index, saved_index in zip(_INDEXES, indexes):
+        index.clear()
+        index.update(saved_index)
 
 
 def get_user_by_email(email: str) -> Optional[dict]:
     """Get user by email."""
-    user_id = user_email_index.get(email)
-    if user_id:
-        return users_db.get(user_id)
+    idx = email_to_idx.get(email)
+    if idx is not None:
+        return _user_at(idx)
     return None
 
 
+def email_exists(email: str) -> bool:
+    """Check whether an email is already registered."""
+    return email in email_to_idx
+
+
 def get_user_by_id(user_id: str) -> Optional[dict]:
     """Get user by ID."""
-    return users_db.get(user_id)
+    idx = id_to_idx.get(user_id)
+    if idx is not None:
+        return _user_at(idx)
+    return None
+
+
+def is_user_active(user_id: str) -> bool:
+    """Check whether a user exists and is active."""
+    idx = id_to_idx.get(user_id)
+    return idx is not None and bool(is_active[idx])
 
 
 def create_user(
@@ -26,31 +102,32 @@ def create_user(
 ) -> dict:
     """Create a new user."""
     user_id = str(uuid.uuid4())
-    user = {
-        "id": user_id,
-        "email": email,
-        "username": username,
-        "hashed_password": hashed_password,
-        "full_name": full_name,
-        "created_at": datetime.utcnow(),
-        "is_active": True,
-    }
-    users_db[user_id] = user
-    user_email_index[email] = user_id
-    return user
+    idx = len(user_ids)
+    user_ids.append(user_id)
+    emails.append(email)
+    usernames.append(username)
+    hashed_passwords.append(hashed_password)
+    full_names.append(full_name)
+    created_ats.append(datetime.utcnow())
+    is_active.append(1)
+    id_to_idx[user_id] = idx
+    email_to_idx[email] = idx
+    return _user_at(idx)
 
 
 def update_user_password(user_id: str, hashed_password: str) -> bool:
     """Update user password."""
-    if user_id in users_db:
-        users_db[user_id]["hashed_password"] = hashed_password
+    idx = id_to_idx.get(user_id)
+    if idx is not None:
+        hashed_passwords[idx] = hashed_password
         return True
     return False
 
 
 def deactivate_user(user_id: str) -> bool:
     """Deactivate user account."""
-    if user_id in users_db:
-        users_db[user_id]["is_active"] = False
+    idx = id_to_idx.get(user_id)
+    if idx is not None:
+        is_active[idx] = 0
         return True
     return False
@@ -2,55 +2,45 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from .db_config import UserDB
 
+users_table = UserDB.__table__
+
 
 def get_user_by_email(db: Session, email: str) -> Optional[dict]:
     """Get user by email."""
-    user = db.query(UserDB).filter(UserDB.email == email).first()
-    if user:
-        return {
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "hashed_password": user.hashed_password,
-            "full_name": user.full_name,
-            "created_at": user.created_at,
-            "is_active": user.is_active,
-            "phone": user.phone,
-            "address_line1": user.address_line1,
-            "address_line2": user.address_line2,
-            "city": user.city,
-            "state": user.state,
-            "postal_code": user.postal_code,
-            "country": user.country,
-        }
-    return None
+    # Core select returns plain row mappings, skipping ORM object hydration
+    row = (
+        db.execute(select(users_table).where(users_table.c.email == email))
+        .mappings()
+        .first()
+    )
+    return dict(row) if row else None
+
+
+def email_exists(db: Session, email: str) -> bool:
+    """Check whether an email is already registered."""
+    query = select(1).where(users_table.c.email == email).limit(1)
+    return db.execute(query).scalar() is not None
 
 
 def get_user_by_id(db: Session, user_id: str) -> Optional[dict]:
     """Get user by ID."""
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
-    if user:
-        return {
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "hashed_password": user.hashed_password,
-            "full_name": user.full_name,
-            "created_at": user.created_at,
-            "is_active": user.is_active,
-            "phone": user.phone,
-            "address_line1": user.address_line1,
-            "address_line2": user.address_line2,
-            "city": user.city,
-            "state": user.state,
-            "postal_code": user.postal_code,
-            "country": user.country,
-        }
-    return None
+    row = (
+        db.execute(select(users_table).where(users_table.c.id == user_id))
+        .mappings()
+        .first()
+    )
+    return dict(row) if row else None
+
+
+def is_user_active(db: Session, user_id: str) -> bool:
+    """Check whether a user exists and is active."""
+    query = select(users_table.c.is_active).where(users_table.c.id == user_id)
+    return bool(db.execute(query).scalar())
 
 
 def create_user(
@@ -4,15 +4,17 @@ from datetime import timedelta
 
 from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from prometheus_fastapi_instrumentator import Instrumentator
-from sqlalchemy.orm import Session
 
 from .auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
+    DUMMY_PASSWORD_HASH,
     create_access_token,
     create_refresh_token,
     get_current_user,
     get_password_hash,
+    get_token_payload,
     verify_password,
     verify_token,
 )
@@ -26,34 +28,13 @@ from .models import (
     UserProfileUpdate,
     UserResponse,
 )
-
-# Check if we should use SQL database or in-memory
-USE_SQL_DB = os.getenv("DATABASE_URL") is not None
-
-if USE_SQL_DB:
-    from .database_sql import (
-        create_user,
-        get_user_by_email,
-        get_user_by_id,
-        update_user_password,
-        update_user_profile,
-    )
-    from .db_config import get_db, init_db
-
-    # Initialize database tables
-    init_db()
-else:
-    from .database import (
-        create_user,
-        get_user_by_email,
-        get_user_by_id,
-        update_user_password,
-    )
+from .repository import repo
 
 app = FastAPI(
     title="Authentication Microservice",
     description="RESTful authentication API for mobile applications",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Prometheus instrumentation
@@ -90,12 +71,16 @@ app.add_middleware(
 )
 
 
-# Conditional database dependency
-def get_db_dependency():
-    """Returns database session if SQL DB is enabled, otherwise None"""
-    if USE_SQL_DB:
-        return Depends(get_db)
-    return None
+async def get_current_user_record(
+    current_user: dict = Depends(get_current_user),
+) -> dict:
+    """Load the authenticated user's record."""
+    user = await repo.get_by_id(current_user["user_id"])
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+    return user
 
 
 @app.get("/")
@@ -126,58 +111,41 @@ async def health_check():
 )
 async def register(
     user_data: UserCreate,
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
 ):
     """Register a new user."""
     # Check if user already exists
-    existing_user = (
-        get_user_by_email(db, user_data.email)
-        if USE_SQL_DB
-        else get_user_by_email(user_data.email)
-    )
-    if existing_user:
+    if await repo.email_exists(user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
-    if USE_SQL_DB:
-        user = create_user(
-            db,
-            user_data.email,
-            user_data.username,
-            hashed_password,
-            user_data.full_name,
-        )
-    else:
-        user = create_user(
-            user_data.email, user_data.username, hashed_password, user_data.full_name
-        )
+    hashed_password = await get_password_hash(user_data.password)
+    user = await repo.create(
+        user_data.email, user_data.username, hashed_password, user_data.full_name
+    )
 
-    return UserResponse(**user)
+    return UserResponse.model_construct(**user)
 
 
 @app.post("/api/v1/auth/login", response_model=Token)
 async def login(
     user_credentials: UserLogin,
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
 ):
     """Login user and return access and refresh tokens."""
     # Get user from database
-    user = (
-        get_user_by_email(db, user_credentials.email)
-        if USE_SQL_DB
-        else get_user_by_email(user_credentials.email)
-    )
+    user = await repo.get_by_email(user_credentials.email)
     if not user:
+        # Burn the same bcrypt cost as a real check to avoid leaking which
+        # emails are registered through response timing
+        await verify_password(user_credentials.password, DUMMY_PASSWORD_HASH)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
 
     # Verify password
-    if not verify_password(user_credentials.password, user["hashed_password"]):
+    if not await verify_password(user_credentials.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -204,7 +172,6 @@ async def login(
 @app.post("/api/v1/auth/refresh", response_model=Token)
 async def refresh_token(
     token_data: RefreshTokenRequest,
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
 ):
     """Refresh access token using refresh token."""
     # Verify refresh token
@@ -218,8 +185,7 @@ async def refresh_token(
         )
 
     # Verify user still exists and is active
-    user = get_user_by_id(db, user_id) if USE_SQL_DB else get_user_by_id(user_id)
-    if not user or not user.get("is_active", True):
+    if not await repo.is_active(user_id):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user"
         )
@@ -235,53 +201,26 @@ async def refresh_token(
 
 
 @app.get("/api/v1/auth/me", response_model=UserResponse)
-async def get_current_user_info(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
-):
+async def get_current_user_info(user: dict = Depends(get_current_user_record)):
     """Get current authenticated user information."""
-    user = (
-        get_user_by_id(db, current_user["user_id"])
-        if USE_SQL_DB
-        else get_user_by_id(current_user["user_id"])
-    )
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-
-    return UserResponse(**user)
+    return UserResponse.model_construct(**user)
 
 
 @app.post("/api/v1/auth/change-password")
 async def change_password(
     password_data: ChangePassword,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
+    user: dict = Depends(get_current_user_record),
 ):
     """Change user password."""
-    user = (
-        get_user_by_id(db, current_user["user_id"])
-        if USE_SQL_DB
-        else get_user_by_id(current_user["user_id"])
-    )
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-
     # Verify old password
-    if not verify_password(password_data.old_password, user["hashed_password"]):
+    if not await verify_password(password_data.old_password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password"
         )
 
     # Update password
-    new_hashed_password = get_password_hash(password_data.new_password)
-    if USE_SQL_DB:
-        update_user_password(db, current_user["user_id"], new_hashed_password)
-    else:
-        update_user_password(current_user["user_id"], new_hashed_password)
+    new_hashed_password = await get_password_hash(password_data.new_password)
+    await repo.update_password(user["id"], new_hashed_password)
 
     return {"message": "Password changed successfully"}
 
@@ -290,18 +229,16 @@ async def change_password(
 async def update_profile(
     profile_data: UserProfileUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db) if USE_SQL_DB else Depends(lambda: None),
 ):
     """Update user profile information including shipping address."""
-    if not USE_SQL_DB:
+    if not repo.supports_profiles:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
             detail="Profile updates require SQL database",
         )
 
     # Update user profile
-    updated_user = update_user_profile(
-        db,
+    updated_user = await repo.update_profile(
         current_user["user_id"],
         full_name=profile_data.full_name,
         phone=profile_data.phone,
@@ -318,11 +255,11 @@ async def update_profile(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    return UserResponse(**updated_user)
+    return UserResponse.model_construct(**updated_user)
 
 
 @app.post("/api/v1/auth/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
+async def logout(token_payload: dict = Depends(get_token_payload)):
     """Logout user (client should delete tokens)."""
     # In a production environment with token blacklisting, add token to blacklist here
     return {"message": "Logged out successfully"}
@@ -331,4 +268,32 @@ async def logout(current_user: dict = Depends(get_current_user)):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers can only share state that lives outside the process: the
+    # in-memory store doesn't, and neither do the random JWT secrets used when
+    # SECRET_KEY/REFRESH_SECRET_KEY are unset (each worker would reject tokens
+    # signed by the others). Only fan out across cores when both are covered.
+    shared_secrets = bool(os.getenv("SECRET_KEY") and os.getenv("REFRESH_SECRET_KEY"))
+    can_scale = shared_secrets and os.getenv("DATABASE_URL") is not None
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() if can_scale else 1))
+    if workers > 1 and not shared_secrets:
+        raise SystemExit(
+            "WEB_CONCURRENCY > 1 requires SECRET_KEY and REFRESH_SECRET_KEY to be "
+            "set, otherwise each worker signs tokens with its own random key"
+        )
+
+    # uvloop is not available on Windows
+    try:
+        import uvloop  # noqa: F401
+
+        loop = "uvloop"
+    except ImportError:
+        loop = "auto"
+
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop=loop,
+        http="httptools",
+    )
@@ -1,7 +1,8 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from email_validator import EmailNotValidError, validate_email
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 
 
 class UserCreate(BaseModel):
@@ -12,9 +13,29 @@ class UserCreate(BaseModel):
 
 
 class UserLogin(BaseModel):
-    email: EmailStr
+    # Full EmailStr validation only matters at registration; login just
+    # needs the address in the same normalized form it was stored in
+    email: str
     password: str
 
+    @field_validator("email")
+    @classmethod
+    def normalize_email(cls, v: str) -> str:
+        v = v.strip()
+        local, sep, domain = v.rpartition("@")
+        if not sep or not local or not domain or len(v) > 254:
+            raise ValueError("value is not a valid email address")
+        domain = domain.lower()
+        if v.isascii() and "xn--" not in domain:
+            # For plain ASCII addresses EmailStr only lower-cases the domain
+            return f"{local}@{domain}"
+        # Unicode and punycode need the same NFC/IDNA normalization EmailStr
+        # applied when the address was stored at registration
+        try:
+            return validate_email(v, check_deliverability=False).normalized
+        except EmailNotValidError:
+            raise ValueError("value is not a valid email address")
+
 
 class UserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,147 @@
+"""
+User storage backends behind a single async interface.
+
+The backend is chosen once at import time from DATABASE_URL, so endpoints
+call ``repo`` without branching on the storage type per request.
+"""
+
+import os
+from typing import Callable, Optional, Protocol
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import database
+
+
+class UserRepo(Protocol):
+    # Whether update_profile is available; the in-memory store has no profile
+    # fields, so endpoints check this before calling it
+    supports_profiles: bool
+
+    async def get_by_email(self, email: str) -> Optional[dict]: ...
+
+    async def get_by_id(self, user_id: str) -> Optional[dict]: ...
+
+    async def email_exists(self, email: str) -> bool: ...
+
+    async def is_active(self, user_id: str) -> bool: ...
+
+    async def create(
+        self,
+        email: str,
+        username: str,
+        hashed_password: str,
+        full_name: Optional[str] = None,
+    ) -> dict: ...
+
+    async def update_password(self, user_id: str, hashed_password: str) -> bool: ...
+
+    async def update_profile(self, user_id: str, **fields) -> Optional[dict]: ...
+
+    async def deactivate(self, user_id: str) -> bool: ...
+
+
+class MemoryUserRepo:
+    """In-memory storage (for development and tests)."""
+
+    supports_profiles = False
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return database.get_user_by_email(email)
+
+    async def get_by_id(self, user_id: str) -> Optional[dict]:
+        return database.get_user_by_id(user_id)
+
+    async def email_exists(self, email: str) -> bool:
+        return database.email_exists(email)
+
+    async def is_active(self, user_id: str) -> bool:
+        return database.is_user_active(user_id)
+
+    async def create(
+        self,
+        email: str,
+        username: str,
+        hashed_password: str,
+        full_name: Optional[str] = None,
+    ) -> dict:
+        return database.create_user(email, username, hashed_password, full_name)
+
+    async def update_password(self, user_id: str, hashed_password: str) -> bool:
+        return database.update_user_password(user_id, hashed_password)
+
+    async def update_profile(self, user_id: str, **fields) -> Optional[dict]:
+        # Never called: the in-memory store has no profile fields, which
+        # supports_profiles = False tells endpoints to check first
+        return None
+
+    async def deactivate(self, user_id: str) -> bool:
+        return database.deactivate_user(user_id)
+
+
+class SqlUserRepo:
+    """SQLAlchemy storage; queries run in the threadpool with their own session."""
+
+    supports_profiles = True
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        from . import database_sql
+
+        self._sql = database_sql
+        self._session_factory = session_factory
+
+    def _call(self, func, *args, **kwargs):
+        with self._session_factory() as db:
+            return func(db, *args, **kwargs)
+
+    async def _run(self, func, *args, **kwargs):
+        return await run_in_threadpool(self._call, func, *args, **kwargs)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self._run(self._sql.get_user_by_email, email)
+
+    async def get_by_id(self, user_id: str) -> Optional[dict]:
+        return await self._run(self._sql.get_user_by_id, user_id)
+
+    async def email_exists(self, email: str) -> bool:
+        return await self._run(self._sql.email_exists, email)
+
+    async def is_active(self, user_id: str) -> bool:
+        # Always ask the database: users can be deactivated outside this
+        # process, and a stale answer would let them keep refreshing tokens
+        return await self._run(self._sql.is_user_active, user_id)
+
+    async def create(
+        self,
+        email: str,
+        username: str,
+        hashed_password: str,
+        full_name: Optional[str] = None,
+    ) -> dict:
+        return await self._run(
+            self._sql.create_user, email, username, hashed_password, full_name
+        )
+
+    async def update_password(self, user_id: str, hashed_password: str) -> bool:
+        return await self._run(self._sql.update_user_password, user_id, hashed_password)
+
+    async def update_profile(self, user_id: str, **fields) -> Optional[dict]:
+        return await self._run(self._sql.update_user_profile, user_id, **fields)
+
+    async def deactivate(self, user_id: str) -> bool:
+        return await self._run(self._sql.deactivate_user, user_id)
+
+
+def _create_repo() -> UserRepo:
+    if os.getenv("DATABASE_URL") is None:
+        return MemoryUserRepo()
+
+    from .db_config import SessionLocal, init_db
+
+    # Initialize database tables
+    init_db()
+    return SqlUserRepo(SessionLocal)
+
+
+repo: UserRepo = _create_repo()
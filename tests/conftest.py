@@ -0,0 +1,5 @@
+import os
+
+# Use the minimum bcrypt cost so password hashing doesn't dominate test time.
+# Must be set before app.auth is imported.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
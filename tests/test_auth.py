@@ -1,20 +1,49 @@
+import time
+from datetime import timedelta
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
-from app.database import user_email_index, users_db
+from app import auth, database_sql, main
+from app.auth import create_access_token, verify_token
+from app.database import clear_users, deactivate_user, restore_users, snapshot_users
+from app.db_config import Base
 from app.main import app
+from app.repository import SqlUserRepo
 
 client = TestClient(app)
 
 
-@pytest.fixture(autouse=True)
-def clear_database():
-    """Clear database before each test."""
-    users_db.clear()
-    user_email_index.clear()
+@pytest.fixture
+def clean_db():
+    """Run the test against an empty user store, restoring it afterwards."""
+    snapshot = snapshot_users()
+    clear_users()
     yield
-    users_db.clear()
-    user_email_index.clear()
+    restore_users(snapshot)
+
+
+@pytest.fixture(scope="session")
+def auth_user():
+    """Register and log in one user shared by tests that don't change it."""
+    user_data = {
+        "email": "test@example.com",
+        "username": "testuser",
+        "password": "testpassword123",
+        "full_name": "Test User",
+    }
+    register_response = client.post("/api/v1/auth/register", json=user_data)
+    assert register_response.status_code == 201, register_response.text
+
+    login_response = client.post(
+        "/api/v1/auth/login",
+        json={"email": user_data["email"], "password": user_data["password"]},
+    )
+    assert login_response.status_code == 200, login_response.text
+    return {**user_data, **login_response.json()}
 
 
 def test_health_check():
@@ -31,10 +60,10 @@ def test_root_endpoint():
     assert "message" in response.json()
 
 
-def test_register_user():
+def test_register_user(clean_db):
     """Test user registration."""
     user_data = {
-        "email": "test@example.com",
+        "email": "register@example.com",
         "username": "testuser",
         "password": "testpassword123",
         "full_name": "Test User",
@@ -47,12 +76,13 @@ def test_register_user():
     assert data["full_name"] == user_data["full_name"]
     assert "id" in data
     assert "created_at" in data
+    assert "hashed_password" not in data
 
 
-def test_register_duplicate_email():
+def test_register_duplicate_email(clean_db):
     """Test registration with duplicate email."""
     user_data = {
-        "email": "test@example.com",
+        "email": "duplicate@example.com",
         "username": "testuser",
         "password": "testpassword123",
     }
@@ -65,18 +95,9 @@ def test_register_duplicate_email():
     assert "already registered" in response.json()["detail"]
 
 
-def test_login_success():
+def test_login_success(auth_user):
     """Test successful login."""
-    # Register user
-    user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
-        "password": "testpassword123",
-    }
-    client.post("/api/v1/auth/register", json=user_data)
-
-    # Login
-    login_data = {"email": "test@example.com", "password": "testpassword123"}
+    login_data = {"email": auth_user["email"], "password": auth_user["password"]}
     response = client.post("/api/v1/auth/login", json=login_data)
     assert response.status_code == 200
     data = response.json()
@@ -85,18 +106,76 @@ def test_login_success():
     assert data["token_type"] == "bearer"
 
 
-def test_login_wrong_password():
-    """Test login with wrong password."""
-    # Register user
+def test_login_email_domain_case_insensitive(auth_user):
+    """Test login matches the stored email regardless of domain case."""
+    local, domain = auth_user["email"].split("@")
+    login_data = {
+        "email": f"{local}@{domain.upper()}",
+        "password": auth_user["password"],
+    }
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 200
+
+
+def test_login_email_surrounding_whitespace(auth_user):
+    """Test login ignores whitespace around the email, as EmailStr does."""
+    login_data = {"email": f" {auth_user['email']} ", "password": auth_user["password"]}
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 200
+
+
+def test_login_punycode_domain(clean_db):
+    """Test login with the punycode form of a Unicode domain."""
     user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
+        "email": "user@bücher.de",
+        "username": "punycodeuser",
         "password": "testpassword123",
     }
-    client.post("/api/v1/auth/register", json=user_data)
+    assert client.post("/api/v1/auth/register", json=user_data).status_code == 201
 
-    # Login with wrong password
-    login_data = {"email": "test@example.com", "password": "wrongpassword"}
+    login_data = {"email": "user@xn--bcher-kva.de", "password": "testpassword123"}
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 200
+
+
+def test_login_full_width_domain(clean_db):
+    """Test login with the same full-width domain used at registration."""
+    user_data = {
+        "email": "user@\uff25\uff38\uff21\uff2d\uff30\uff2c\uff25.com",
+        "username": "fullwidthuser",
+        "password": "testpassword123",
+    }
+    assert client.post("/api/v1/auth/register", json=user_data).status_code == 201
+
+    login_data = {"email": user_data["email"], "password": "testpassword123"}
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 200
+
+
+def test_login_decomposed_local_part(clean_db):
+    """Test login with the same decomposed Unicode local part used at registration."""
+    user_data = {
+        "email": "jose\u0301@example.com",
+        "username": "decomposeduser",
+        "password": "testpassword123",
+    }
+    assert client.post("/api/v1/auth/register", json=user_data).status_code == 201
+
+    login_data = {"email": user_data["email"], "password": "testpassword123"}
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 200
+
+
+def test_login_invalid_email():
+    """Test login with a malformed email."""
+    login_data = {"email": "not-an-email", "password": "testpassword123"}
+    response = client.post("/api/v1/auth/login", json=login_data)
+    assert response.status_code == 422
+
+
+def test_login_wrong_password(auth_user):
+    """Test login with wrong password."""
+    login_data = {"email": auth_user["email"], "password": "wrongpassword"}
     response = client.post("/api/v1/auth/login", json=login_data)
     assert response.status_code == 401
 
@@ -108,31 +187,16 @@ def test_login_nonexistent_user():
     assert response.status_code == 401
 
 
-def test_get_current_user():
+def test_get_current_user(auth_user):
     """Test getting current user information."""
-    # Register and login
-    user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
-        "password": "testpassword123",
-        "full_name": "Test User",
-    }
-    client.post("/api/v1/auth/register", json=user_data)
-
-    login_response = client.post(
-        "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "testpassword123"},
-    )
-    token = login_response.json()["access_token"]
-
-    # Get current user
     response = client.get(
-        "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+        "/api/v1/auth/me",
+        headers={"Authorization": f"Bearer {auth_user['access_token']}"},
     )
     assert response.status_code == 200
     data = response.json()
-    assert data["email"] == user_data["email"]
-    assert data["username"] == user_data["username"]
+    assert data["email"] == auth_user["email"]
+    assert data["username"] == auth_user["username"]
 
 
 def test_get_current_user_no_token():
@@ -141,45 +205,92 @@ def test_get_current_user_no_token():
     assert response.status_code == 403
 
 
-def test_refresh_token():
+def test_refresh_token(auth_user):
     """Test refreshing access token."""
-    # Register and login
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": auth_user["refresh_token"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert "access_token" in data
+    assert "refresh_token" in data
+
+
+def test_refresh_token_deactivated_user(clean_db):
+    """Test that a deactivated user cannot refresh tokens."""
     user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
+        "email": "deactivated@example.com",
+        "username": "deactivateduser",
         "password": "testpassword123",
     }
-    client.post("/api/v1/auth/register", json=user_data)
+    user_id = client.post("/api/v1/auth/register", json=user_data).json()["id"]
 
     login_response = client.post(
         "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "testpassword123"},
+        json={"email": "deactivated@example.com", "password": "testpassword123"},
     )
     refresh_token = login_response.json()["refresh_token"]
+    deactivate_user(user_id)
 
-    # Refresh token
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 401
+
+
+def test_refresh_token_deactivated_user_sql(monkeypatch, tmp_path):
+    """Test that a user deactivated in the SQL database cannot refresh tokens."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'auth.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(main, "repo", SqlUserRepo(session_factory))
+
+    user_data = {
+        "email": "sqluser@example.com",
+        "username": "sqluser",
+        "password": "testpassword123",
+    }
+    user_id = client.post("/api/v1/auth/register", json=user_data).json()["id"]
+
+    login_response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "sqluser@example.com", "password": "testpassword123"},
+    )
+    refresh_token = login_response.json()["refresh_token"]
+
+    # A healthy refresh succeeds
     response = client.post(
         "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
     )
     assert response.status_code == 200
-    data = response.json()
-    assert "access_token" in data
-    assert "refresh_token" in data
 
+    # Deactivate outside the app, as an admin tool would
+    with session_factory() as db:
+        database_sql.deactivate_user(db, user_id)
 
-def test_change_password():
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 401
+    engine.dispose()
+
+
+def test_change_password(clean_db):
     """Test changing password."""
-    # Register and login
+    # Register and login a dedicated user, since this test changes its password
     user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
+        "email": "change@example.com",
+        "username": "changeuser",
         "password": "oldpassword123",
     }
     client.post("/api/v1/auth/register", json=user_data)
 
     login_response = client.post(
         "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "oldpassword123"},
+        json={"email": "change@example.com", "password": "oldpassword123"},
     )
     token = login_response.json()["access_token"]
 
@@ -194,36 +305,100 @@ def test_change_password():
     # Try login with old password (should fail)
     old_login = client.post(
         "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "oldpassword123"},
+        json={"email": "change@example.com", "password": "oldpassword123"},
     )
     assert old_login.status_code == 401
 
     # Try login with new password (should succeed)
     new_login = client.post(
         "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "newpassword123"},
+        json={"email": "change@example.com", "password": "newpassword123"},
     )
     assert new_login.status_code == 200
 
 
-def test_logout():
-    """Test logout endpoint."""
-    # Register and login
-    user_data = {
-        "email": "test@example.com",
-        "username": "testuser",
-        "password": "testpassword123",
-    }
-    client.post("/api/v1/auth/register", json=user_data)
-
-    login_response = client.post(
-        "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "testpassword123"},
+def test_update_profile_requires_sql(auth_user):
+    """Test that profile updates are rejected by the in-memory backend."""
+    response = client.put(
+        "/api/v1/auth/profile",
+        json={"city": "Ljubljana"},
+        headers={"Authorization": f"Bearer {auth_user['access_token']}"},
     )
-    token = login_response.json()["access_token"]
+    assert response.status_code == 501
+
 
-    # Logout
+def test_logout(auth_user):
+    """Test logout endpoint."""
     response = client.post(
-        "/api/v1/auth/logout", headers={"Authorization": f"Bearer {token}"}
+        "/api/v1/auth/logout",
+        headers={"Authorization": f"Bearer {auth_user['access_token']}"},
     )
     assert response.status_code == 200
+
+
+def test_refresh_with_access_token_rejected(auth_user):
+    """Test that an access token cannot be used as a refresh token."""
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": auth_user["access_token"]}
+    )
+    assert response.status_code == 401
+
+
+def test_get_current_user_tampered_token():
+    """Test that a token with a modified signature is rejected."""
+    token = create_access_token(data={"sub": "some-id", "email": "test@example.com"})
+    tampered = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+
+    response = client.get(
+        "/api/v1/auth/me", headers={"Authorization": f"Bearer {tampered}"}
+    )
+    assert response.status_code == 401
+
+
+def test_get_current_user_expired_token():
+    """Test that an expired token is rejected."""
+    token = create_access_token(
+        data={"sub": "some-id", "email": "test@example.com"},
+        expires_delta=timedelta(seconds=-1),
+    )
+
+    response = client.get(
+        "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 401
+
+
+def test_verify_token_served_from_cache(monkeypatch):
+    """Test that a second verification of a token skips decoding."""
+    token = create_access_token(data={"sub": "cached-id", "email": "c@example.com"})
+    payload = verify_token(token)
+
+    def fail_decode(token, key):
+        raise AssertionError("token should have been served from the cache")
+
+    monkeypatch.setattr(auth, "_decode_jwt", fail_decode)
+    assert verify_token(token) == payload
+
+
+def test_verify_token_expired_after_caching():
+    """Test that a token verified while valid is rejected once it expires."""
+    token = create_access_token(
+        data={"sub": "expiring-id", "email": "e@example.com"},
+        expires_delta=timedelta(seconds=1),
+    )
+    payload = verify_token(token)
+
+    time.sleep(max(0.0, payload["exp"] - time.time()) + 0.05)
+    with pytest.raises(HTTPException) as exc_info:
+        verify_token(token)
+    assert exc_info.value.status_code == 401
+
+
+def test_verify_token_cached_access_token_rejected_as_refresh():
+    """Test that a cached access token is still rejected as a refresh token."""
+    token = create_access_token(data={"sub": "typed-id", "email": "t@example.com"})
+    verify_token(token)
+
+    with pytest.raises(HTTPException) as exc_info:
+        verify_token(token, "refresh")
+    assert exc_info.value.status_code == 401